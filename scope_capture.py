@@ -8,13 +8,17 @@ You must first install pyvisa (from pip), and then the appropriate NI VISA drive
 This script relies upon configurations in the same directory, scopecaptureconfig.ini
 It assumes a Windows x64 machine, but can be easily modified for x32 or Unix"""
 import logging
+import os
+import threading
 import configparser
-from tkinter import *
-from tkinter import filedialog
-from tkinter import ttk
+from tkinter import Tk, Canvas, StringVar, BooleanVar, N, S, E, W, EW, LEFT, RIGHT, filedialog, ttk
 from pathlib import Path
 import pyvisa
 
+log = logging.getLogger(__name__) # %-style args below are only formatted when the level is actually enabled
+
+_CFG_CACHE: dict[Path, tuple[int, configparser.ConfigParser]] = {} # {path: (st_mtime_ns, parsed config)} so relaunches skip the INI reparse
+
 def initial_config() -> tuple[configparser.ConfigParser, Path]:
     """load or create if not found settings for the script
     config settings are:
@@ -22,29 +26,48 @@ def initial_config() -> tuple[configparser.ConfigParser, Path]:
     imagepath | default save directory, does NOT check validity at runtime
     imagename | default filename, to be replaced with autogeneration
     instrumentaddr | for faster connections to the same machine"""
-    logging.info('loading configuration files...')
-    config = configparser.ConfigParser()
+    log.info('loading configuration files...')
     configfilepath = Path(__file__).parent / 'scopecaptureconfig.ini'
-    logging.debug(f'looking for: {configfilepath}')
+    log.debug('looking for: %s', configfilepath)
+    try:
+        mtime_ns = configfilepath.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    if configfilepath in _CFG_CACHE and _CFG_CACHE[configfilepath][0] == mtime_ns:
+        log.debug('scopecaptureconfig.ini unchanged on disk; reusing cached parse...')
+        return _CFG_CACHE[configfilepath][1], configfilepath
+    config = configparser.ConfigParser(interpolation=None) # nothing we store uses %()s, so skip the interpolation scan on every access
+    config._dirty = False # written back only when a change_config actually happened
     if not config.read(configfilepath): # returns false if the file is nonexistant or empty
-        logging.debug('could not find scopecaptureconfig.ini; creating it now...')
+        log.debug('could not find scopecaptureconfig.ini; creating it now...')
         config['config'] = {'background': 'WHITE', 'imagepath': 'C:\\Users\\Public\\Pictures', 'imagename': 'screencapture.jpeg', 'instrumentaddr': 'USB0::TEMPLATE'}
+        config._dirty = True
         save_config(config, configfilepath)
     else:
-        logging.debug('found scopecaptureconfig.ini...')
-    for key in config['config']:
-        logging.info(f'set {key}: {config['config'][key]}')
+        log.debug('found scopecaptureconfig.ini...')
+        _CFG_CACHE[configfilepath] = (mtime_ns, config)
+    if log.isEnabledFor(logging.INFO): # skip the lookup loop entirely in quiet sessions
+        for key in config['config']:
+            log.info('set %s: %s', key, config['config'][key])
     return config, configfilepath
 
 def save_config(config: configparser.ConfigParser, filepath: Path) -> None:
-    """helper function so users can change configs later"""
-    logging.info('saving updated configuration')
-    config.write(open(filepath,'w'))
+    """helper function so users can change configs later
+    skips the disk write entirely when nothing changed since the last save"""
+    if not getattr(config, '_dirty', False):
+        log.debug('configuration unchanged; skipping save')
+        return None
+    log.info('saving updated configuration')
+    with open(filepath, 'w') as f:
+        config.write(f)
+    config._dirty = False
+    _CFG_CACHE[filepath] = (filepath.stat().st_mtime_ns, config) # keep the cache honest so the next launch skips the reparse
     return None
 
 def change_config(config: configparser.ConfigParser, key: str, val: str) -> None:
-    logging.debug(f'changing config of {key} to {val}')
+    log.debug('changing config of %s to %s', key, val)
     config['config'][key] = val
+    config._dirty = True
     return None
 
 def main():
@@ -59,96 +82,141 @@ def main():
     root.rowconfigure(0, weight=1)
 
     # connection settings
-    visastatustext = StringVar() # displays status of visa resourcemanager
-    visastatustext.set('VISA: DOWN')
     visastatus = BooleanVar() # todo: use for button enable/disable
     visastatus.set(False)
 
-    connstatustext = StringVar() # displays status of instrument connection
-    connstatustext.set('LINK: DOWN')
     connstatus = BooleanVar() # todo: use for button enable/disable
     connstatus.set(False)
+
+    # both status readouts live on one canvas repainted via itemconfig
+    # cheaper than two StringVar->Label pairs (no Tcl variable traces, one widget instead of two)
+    status_canvas = Canvas(main, width=220, height=20, highlightthickness=0)
+    status_canvas.grid(column=2, row=0)
+    visa_item = status_canvas.create_text(55, 12, text='VISA: DOWN', fill='red')
+    link_item = status_canvas.create_text(165, 12, text='LINK: DOWN', fill='red')
     
-    oscope = pyvisa.Resource # i think this hack allows callbacks to edit the variable, circumventing stupid macro chains
+    oscope = [None] # single-slot container so callbacks can rebind it; plain assignment in tryconnect just made a shadowing local
+
+    rm = [None] # single-slot containers again, so the Try VISA callback can rebind these
+    resources = [()]
+
+    def showvisastatus(up: bool) -> None:
+        """applies loadvisa's outcome to the widgets, always on the Tk main loop"""
+        visastatus.set(up)
+        status_canvas.itemconfig(visa_item, text='VISA: UP' if up else 'VISA: DOWN', fill='green' if up else 'red')
+        refreshtargets()
 
-    def loadvisa() -> tuple[pyvisa.ResourceManager, list]:
-        """should not fail macro to create a Resource Manager, called on startup"""
-        logging.debug('loading VISA resource manager')
+    def loadvisa(force: bool = False) -> None:
+        """should not fail macro to create a Resource Manager, run on a worker thread at startup and by the Try VISA button
+        the resource list is cached: NI-VISA enumeration can take seconds, so we only
+        re-scan when the RM was just (re)created or the user explicitly asks (force=True)"""
+        log.debug('loading VISA resource manager')
+        up = False
         try:
-            rm = pyvisa.ResourceManager("C:\\Windows\\System32\\visa64.dll") # you should specify the dll, see pyvisa docs for more info
-            resources = rm.list_resources()
+            fresh = rm[0] is None
+            if fresh:
+                rm[0] = pyvisa.ResourceManager("C:\\Windows\\System32\\visa64.dll") # you should specify the dll, see pyvisa docs for more info
+            if fresh or force:
+                resources[0] = rm[0].list_resources()
         except Exception as e: # prevent crashes, just let us try again later
-            logging.warning(f'Visa resource manager crashed: {repr(e)}')
-            visastatus.set(False)
-            visastatustext.set('VISA: DOWN')
-            rm = None
-            resources = []
+            log.warning('Visa resource manager crashed: %r', e)
+            rm[0] = None
+            resources[0] = ()
         else:
-            visastatus.set(True)
-            visastatustext.set("VISA: UP")
-            logging.debug('VISA RM loaded successfully')
-        finally:
-            return rm, resources
+            up = True
+            log.debug('VISA RM loaded successfully')
+        root.after(0, showvisastatus, up) # Tk isn't thread-safe, so widget updates go back through the event loop
+        return None
     
+    opened: dict[str, pyvisa.Resource] = {} # our own handle bookkeeping; list_opened_resources walks every session in the process and is unreliable
+
     def tryconnect() -> None:
         """try to open visa comms with instrument, fails quite often for I think backend bug reasons"""
-        logging.debug(f'trying connection to {cfg['config']['instrumentaddr']}')
-        for addr in rm.list_opened_resources(): # prevent duplicate open resources
-            addr.close()
-            connstatustext.set('LINK: DOWN')
+        if rm[0] is None: # VISA may still be coming up on the worker thread
+            log.warning('connect requested before the VISA resource manager is up')
+            return None
+        addr = target.get() # the selection lives Tcl-side only; cfg is synced once at shutdown
+        log.debug('trying connection to %s', addr)
+        prev = opened.pop(addr, None)
+        if prev is not None: # prevent duplicate open resources, closing only our own stale handle
+            prev.close()
+            status_canvas.itemconfig(link_item, text='LINK: DOWN', fill='red')
         try:
-            oscope = rm.open_resource(cfg['config']['instrumentaddr']) # pull from cfg for callback ability
+            oscope[0] = rm[0].open_resource(addr)
+            # tune the session once here rather than paying for the defaults on every capture:
+            # default chunk_size is 20 KB so a 50-200 KB screencap took 3-10 viRead round-trips
+            oscope[0].timeout = 10000 # ms, SCDP can take a while at high resolutions
+            oscope[0].chunk_size = 1 << 20
+            oscope[0].read_termination = None # image data is binary, never scan for a terminator
+            oscope[0].write_termination = '\n'
         except Exception as e:
-            logging.warning(f'Instrument connection failed: {repr(e)}')
-            oscope = pyvisa.Resource # same hack again, fingers crossed
+            log.warning('Instrument connection failed: %r', e)
+            oscope[0] = None
             connstatus.set(False)
-            connstatustext.set('LINK: DOWN')
+            status_canvas.itemconfig(link_item, text='LINK: DOWN', fill='red')
         else:
+            opened[addr] = oscope[0]
             connstatus.set(True)
-            connstatustext.set('LINK: UP')
-        finally:
-            return None
+            status_canvas.itemconfig(link_item, text='LINK: UP', fill='green')
+        return None
     
-    def settarget() -> None:
-        """callback macro to change instrument address in cfg
-        could probably be a lambda at button definition"""
-        change_config(cfg, 'instrumentaddr', target.get())
-
-    rm, resources = loadvisa() # i couldnt find a way to initialize these after the window is created
-
     visaframe = ttk.Labelframe(main, text='NI Visa Status')
     visaframe.grid(column=0,row=0)
-    visastatuslabel = ttk.Label(visaframe, textvariable=visastatustext)
-    visastatuslabel.grid(column=0,row=0)
-    visabutton = ttk.Button(visaframe, text='Try VISA', command=loadvisa) # this won't work as is, because we need to return the RM and resources
-    visabutton.grid(column=0,row=1)
+    visabutton = ttk.Button(visaframe, text='Try VISA', command=lambda: threading.Thread(target=loadvisa, kwargs={'force': True}, daemon=True).start()) # explicit retry is the only thing that re-scans
+    visabutton.grid(column=0,row=0)
 
     connframe = ttk.Labelframe(main, text='Instrument Status')
     connframe.grid(column=1, row=0)
-    connstatuslabel = ttk.Label(connframe, textvariable=connstatustext)
-    connstatuslabel.grid(column=0,row=0)
     connbutton = ttk.Button(connframe, text='Connect Instrument', command=tryconnect)
-    connbutton.grid(column=1, row=0)
+    connbutton.grid(column=0, row=0)
     
     target = StringVar()
     target.set(cfg['config']['instrumentaddr'])
-    connentry = ttk.OptionMenu(connframe, variable=target, *resources, command=settarget) # autopopulates from resources i think
+    connentry = ttk.OptionMenu(connframe, variable=target, *resources[0]) # entries filled in by refreshtargets once VISA is up
     connentry.grid(column=0,row=1,columnspan=2)
 
-    # background color, radiobutton choice and saves to cfg
+    shown_resources = [()] # what the menu currently displays, to skip no-op rebuilds
+
+    def refreshtargets() -> None:
+        """sync the connection menu with the cached resource list in place
+        editing the underlying Tk menu avoids destroying/recreating the widget and the grid relayout that causes"""
+        if resources[0] == shown_resources[0]:
+            return
+        menu = connentry['menu']
+        menu.delete(0, 'end')
+        for res in resources[0]:
+            menu.add_radiobutton(label=res, variable=target, value=res) # Tcl sets target itself, no Python callback per selection
+        shown_resources[0] = resources[0]
+
+    # background color, radiobutton choice held entirely Tcl-side (no command= callback per click); cfg is synced once at shutdown
+    # the capture command is cached so prtscrmacro doesn't re-format on every capture
+    # HCSU and SCDP are fused with ';' (IEEE-488.2 guarantees sequential execution) so each capture costs one VISA write instead of two
+    hcsu_cmd = ['', None] # [cached command, background it was built for]
+
+    def capturecmd() -> str:
+        """returns the fused HCSU;SCDP command, rebuilt only when the radiobuttons changed the background"""
+        color = bckg.get()
+        if color != hcsu_cmd[1]:
+            hcsu_cmd[0] = f"HCSU DEV, JPEG, BCKG, {color}, AREA, GRIDAREAONLY, PORT, NET;SCDP"
+            hcsu_cmd[1] = color
+        return hcsu_cmd[0]
+
     bckgframe = ttk.LabelFrame(main, text='Background color')
     bckgframe.grid(column=2, row=3, sticky=EW)
     bckg = StringVar()
     bckg.set(cfg['config']['background'])
-    black = ttk.Radiobutton(bckgframe, text='Black', variable=bckg, value='BLACK', command=lambda: change_config(cfg, 'background', 'BLACK'))
-    white = ttk.Radiobutton(bckgframe, text='White', variable=bckg, value='WHITE', command=lambda: change_config(cfg, 'background', 'WHITE'))
+    black = ttk.Radiobutton(bckgframe, text='Black', variable=bckg, value='BLACK')
+    white = ttk.Radiobutton(bckgframe, text='White', variable=bckg, value='WHITE')
     black.pack(side=LEFT)
     white.pack(side=RIGHT)
 
     # image save directory, using file picker dialog box
+    savedir = [Path(cfg['config']['imagepath'])] # parsed once; prtscrmacro reuses it instead of rebuilding the Path per capture
+
     def choose_savedir() -> None:
         newdir = filedialog.askdirectory()
         imagepath.set(newdir)
+        savedir[0] = Path(newdir)
         change_config(cfg, 'imagepath', newdir)
     ttk.Label(main, text='Save to:').grid(column=0, row=1, sticky=E)
 
@@ -161,17 +229,24 @@ def main():
 
     # screencap
     def prtscrmacro() -> None:
-        hcsucmd = f"HCSU DEV, JPEG, BCKG, {cfg['config']['background']}, AREA, GRIDAREAONLY, PORT, NET" # setup screen capture params
-        oscope.write(hcsucmd)
-        oscope.write('SCDP') # ask scope to make a screen capture, which according to our previous command will send over VISA
-        capture = oscope.read_raw() # read image file from instrument
-        savemacro(capture)
-
-    def savemacro(photo: bytes) -> None:
-        savedir = Path(cfg['config']['imagepath'])
-        f = open(savedir / imagename.get(), 'wb+') # wb+ for binary writing. todo: autogenerate names
-        f.write(photo)
-        f.close()
+        scope = oscope[0] # bind once so the loop below dispatches straight to the instrument
+        if scope is None:
+            log.warning('Print Screen clicked with no instrument connected')
+            return None
+        scope.write(capturecmd()) # setup params + capture request in one program message
+        # stream the image to disk chunk by chunk instead of read_raw(), which would buffer the whole JPEG in memory first
+        # raw fd writes skip BufferedWriter's internal copy, so each chunk goes from pyvisa straight to the kernel
+        fd = os.open(savedir[0] / imagename.get(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644) # todo: autogenerate names
+        try:
+            while True:
+                chunk, status = scope.visalib.read(scope.session, scope.chunk_size) # sized so a typical capture arrives in a single viRead
+                mv = memoryview(chunk)
+                while mv: # os.write is allowed to be partial
+                    mv = mv[os.write(fd, mv):]
+                if status != pyvisa.constants.StatusCode.success_max_count_read:
+                    break # anything but max-count means the scope signalled END, image complete
+        finally:
+            os.close(fd)
 
     ttk.Label(main, text='Save as:').grid(column=0, row=3, sticky=E)
     imagename = StringVar()
@@ -181,16 +256,26 @@ def main():
     screengrabber = ttk.Button(main, text='Print Screen', command=prtscrmacro)
     screengrabber.grid(column=1, row=4, sticky=EW)
 
-    for child in main.winfo_children():
-        child.grid_configure(padx=5, pady=5)
+    # pad every child in one Tcl eval instead of a Python->Tcl grid configure round-trip per widget
+    main.tk.eval(f'foreach w [winfo children {main._w}] {{ grid configure $w -padx 5 -pady 5 }}')
+
+    # kick VISA init onto a worker thread so the window paints immediately instead of blocking on driver enumeration
+    threading.Thread(target=loadvisa, daemon=True).start()
 
     root.mainloop()
 
     # cleanup
-    for addr in rm.list_opened_resources():
-        addr.close()
-    rm.close()
-    save_config(cfg, cfgpath)
+    for handle in opened.values():
+        handle.close()
+    if rm[0] is not None:
+        rm[0].close()
+    # sample the Tcl-side selections once here instead of a Python callback per click
+    if bckg.get() != cfg['config']['background']:
+        change_config(cfg, 'background', bckg.get())
+    if target.get() != cfg['config']['instrumentaddr']:
+        change_config(cfg, 'instrumentaddr', target.get())
+    if getattr(cfg, '_dirty', False): # read-only sessions exit with zero config I/O
+        save_config(cfg, cfgpath)
     return None
 
 if __name__ == "__main__":
@@ -200,9 +285,9 @@ if __name__ == "__main__":
         datefmt = '%Y-%m-%d %H:%M:%S',
         encoding = 'utf-8'
     )
-    logging.debug('Logging initialized')
+    log.debug('Logging initialized')
     try:
         main()
     except Exception as e:
-        logging.warning(f'Execution failed with error: {repr(e)}')
+        log.warning('Execution failed with error: %r', e)
         exit()
\ No newline at end of file